@@ -3,19 +3,22 @@ import argparse
 import array
 import hashlib
 import logging
+import mmap
 import os
 import re
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Optional
 
-import pandas as pd
+import numpy as np
 import pyarrow as pa
 import pyarrow.parquet as pq
 from pymavlink import mavutil
 
 # Configure the root logger
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(funcName)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -27,6 +30,158 @@ for lib in ('boto3', 'botocore', 'urllib3', 'pandas',
     # Change from DEBUG to WARNING
     logging.getLogger(lib).setLevel(logging.WARNING)
 
+# Read size used when hashing without hashlib.file_digest
+SHA256_BLOCK_SIZE = 1 << 22  # 4 MB
+
+# Boot metadata is logged early; pre-scans give up after this many bytes
+PRESCAN_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+
+# Parquet writer settings shared by all extractors. Timestamp and LineNumber
+# increase monotonically, so they are delta encoded instead of dictionary
+# encoded.
+PARQUET_WRITE_OPTIONS = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "use_dictionary": ["Value", "StringValue", "BinaryValue"],
+    "column_encoding": {
+        "Timestamp": "DELTA_BINARY_PACKED",
+        "LineNumber": "DELTA_BINARY_PACKED",
+    },
+    "write_statistics": True,
+    "data_page_size": 1 << 20,  # 1MB pages
+}
+
+# Approximate Python heap held by one BIN (message type, instance) batch
+# before it is written. Rows are buffered as tuples of boxed values: about
+# 64 bytes per row (tuple header, list slot, Timestamp and LineNumber) plus
+# 32 per field (tuple slot and a float object). Narrow messages get long row
+# groups and wide ones are flushed sooner. This bounds each batch only;
+# every open group holds a partial batch and up to MAX_PENDING_BATCHES full
+# ones wait for writers, so the total grows with the number of groups.
+BIN_BATCH_BYTES = 8 << 20  # 8 MB
+BIN_ROW_BYTES = 64
+BIN_FIELD_BYTES = 32
+MIN_BATCH_ROWS = 1024
+
+# BIN FMT format characters (char[4], char[16], char[64]) kept as text
+BIN_TEXT_FORMATS = frozenset("nNZ")
+# BIN message fields that are not written as KeyName columns
+BIN_SKIP_FIELDS = frozenset({"TimeUS", "MessageType", "mavpackettype"})
+
+# Threads used for per-file flushes. Arrow releases the GIL while encoding
+# and compressing, so independent files overlap across cores.
+PARQUET_WRITE_WORKERS = min(16, os.cpu_count() or 1)
+# Full batches that may wait for a writer thread before reading blocks
+MAX_PENDING_BATCHES = 2 * PARQUET_WRITE_WORKERS
+
+# Board banner printed at boot, e.g. "CubeOrangePlus-Volanti <cube id>"
+CUBE_ID_PATTERN = re.compile(
+    r"(?:Carbonix)?CubeOrange(?:Plus)?"
+    r"(?:-(?:Volanti|Ottano|Octano))?\s+(\S.*)"
+)
+
+
+def _int64_array(values):
+    """Wraps an array.array('q') as an Arrow int64 array without copying."""
+    return pa.Array.from_buffers(pa.int64(), len(values),
+                                 [None, pa.py_buffer(values)])
+
+
+def _float32_values(values):
+    """Builds the float32 Value column from a float32 buffer; NaN entries
+    (missing or unconvertible values) become nulls via the validity bitmap."""
+    return pa.array(np.frombuffer(values, dtype=np.float32), from_pandas=True)
+
+
+def _numeric_field(value):
+    return float(value), None, None
+
+
+def _bin_text_field(value):
+    return None, str(value), None
+
+
+def _bin_array_field(value):
+    val = float(value[0]) if value.typecode == 'h' and value else None
+    return val, None, value.tobytes()
+
+
+def _bin_text_columns(column):
+    """Converts a BIN text field column to (Value, StringValue, BinaryValue)."""
+    size = len(column)
+    return (pa.nulls(size, pa.float32()),
+            pa.array(list(map(str, column)), type=pa.string()),
+            pa.nulls(size, pa.binary()))
+
+
+def _bin_numeric_columns(column):
+    """Converts one BIN field column to (Value, StringValue, BinaryValue).
+
+    Plain numbers are converted by Arrow in one call. Columns holding
+    None or other non-numeric values fall back to _bin_mixed_columns.
+    """
+    try:
+        values = pa.array(column, type=pa.float64())
+        if not values.null_count:
+            size = len(values)
+            return (_float32_values(values.cast(pa.float32()).to_numpy()),
+                    pa.nulls(size, pa.string()), pa.nulls(size, pa.binary()))
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    return _bin_mixed_columns(column)
+
+
+def _bin_mixed_columns(column):
+    """Converts a BIN field column one value at a time with the per-value
+    converters; used for array fields and for columns Arrow cannot convert
+    in bulk. Values that are not numbers are kept as text."""
+    nan = float('nan')
+    floats = array.array('f')
+    str_values = []
+    bin_values = []
+    for value in column:
+        convert = (_bin_array_field if isinstance(value, array.array)
+                   else _numeric_field)
+        try:
+            val, text, binary = convert(value)
+        except (TypeError, ValueError):
+            val, text, binary = _bin_text_field(value)
+        floats.append(nan if val is None else val)
+        str_values.append(text)
+        bin_values.append(binary)
+    return (_float32_values(floats), pa.array(str_values, type=pa.string()),
+            pa.array(bin_values, type=pa.binary()))
+
+
+def _bin_column_converter(format_type):
+    """Picks the column converter for a BIN field's FMT format character."""
+    if not format_type or format_type in BIN_TEXT_FORMATS:
+        return _bin_text_columns
+    if format_type == "a":
+        return _bin_mixed_columns
+    return _bin_numeric_columns
+
+
+def _bin_field_converter(format_type):
+    """Picks the per-value converter returning (Value, StringValue,
+    BinaryValue) for a BIN field's FMT format character."""
+    if not format_type or format_type in BIN_TEXT_FORMATS:
+        return _bin_text_field
+    if format_type == "a":
+        return _bin_array_field
+    return _numeric_field
+
+
+# TLOG field value -> (Value, StringValue, BinaryValue), keyed by exact type
+# so the field loop does one dict lookup instead of isinstance chains.
+# Anything not listed is treated as numeric.
+TLOG_FIELD_CONVERTERS = {
+    str: lambda value: (None, value, None),
+    bytearray: lambda value: (None, None, bytes(value)),
+    array.array: lambda value: (None, None, bytes(value)),
+    list: lambda value: (None, None, str(value)),
+}
+
 
 class ArduPilotLogHandler:
     def __init__(self, log_file_path: str, output_path: str = "output"):
@@ -37,23 +192,63 @@ class ArduPilotLogHandler:
         self.boot_time = None
         self.boot_time_diff = None
         self.boot_number = 0
-        self.log_uid = None
+        self._log_uid = None
+        self._log_uid_future = None
         self.log_type = None
         self.clock_offset = None
         self.log_format = None
         self.output_path = output_path
         self.file_name = os.path.basename(log_file_path)
+        self._progress_count = 0
 
+        # Fail fast: the hash below runs in the background and would only
+        # surface a missing log at the first log_uid access
+        os.stat(self.log_file_path)
         logger.info(f"Log handler initialized for {self.log_file_path}")
         self.detect_log_type()
         logger.debug(f"Log type: {self.log_type}")
-        self.log_uid = self.calculate_sha256()
-        logger.debug(f"Log UID: {self.log_uid}")
+        self._prefetch_log()
+        # Hash in the background; hashlib releases the GIL while hashing, so
+        # this overlaps with the metadata pre-scan in process_log()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._log_uid_future = executor.submit(self.calculate_sha256)
+        executor.shutdown(wait=False)
+
+    @property
+    def log_uid(self) -> str:
+        """SHA256 of the log file, waiting for the background hash if needed."""
+        if self._log_uid_future is not None:
+            self._log_uid = self._log_uid_future.result()
+            self._log_uid_future = None
+            logger.debug(f"Log UID: {self._log_uid}")
+        return self._log_uid
+
+    @log_uid.setter
+    def log_uid(self, value: str):
+        self._log_uid_future = None
+        self._log_uid = value
 
     def get_log_uid(self) -> str:
         """Returns the SHA256 hash of the log file."""
         return self.log_uid
 
+    def _prefetch_log(self):
+        """Asks the kernel to start reading the log into the page cache.
+
+        Every pass over the log is a sequential read, so readahead started
+        now overlaps with hashing and the metadata pre-scan.
+        """
+        if not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            fd = os.open(self.log_file_path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.debug(f"Could not prefetch {self.log_file_path}: {e}")
+
     def detect_log_type(self):
         """Detects the log type based on the file extension."""
         _, file_extension = os.path.splitext(self.log_file_path)
@@ -66,32 +261,44 @@ class ArduPilotLogHandler:
 
     def get_clock_offset(self):
         """Calculates the average clock offset between GPS and PC."""
-        average_offset = 0
-        num_offsets = 0
+        timestamps = array.array('d')
+        time_unix_usecs = array.array('Q')
         mavlog = mavutil.mavlink_connection(self.log_file_path)
 
         while True:
             msg = mavlog.recv_match(type=['SYSTEM_TIME', 'GPS_RAW_INT'])
             if not msg:
                 break
-
-            if (msg.get_srcComponent() != 1 or
-                    (msg.get_type() == 'GPS_RAW_INT' and msg.fix_type < 3)):
-                continue
-
-            time_unix_usec = (msg.time_unix_usec if msg.get_type()
-                              == 'SYSTEM_TIME' else msg.time_usec)
-
-            # Ignore times before 2000
-            if time_unix_usec < 946684800000000:
-                continue
-
-            offset = msg._timestamp - time_unix_usec / 1_000_000
-            num_offsets += 1
-            average_offset += (offset - average_offset) / num_offsets
+            self._add_clock_sample(msg, timestamps, time_unix_usecs)
 
         mavlog.rewind()
-        self.clock_offset = average_offset
+        self._set_clock_offset(timestamps, time_unix_usecs)
+
+    def _add_clock_sample(self, msg, timestamps, time_unix_usecs):
+        """Records a SYSTEM_TIME/GPS_RAW_INT sample for the clock offset."""
+        if (msg.get_srcComponent() != 1 or
+                (msg.get_type() == 'GPS_RAW_INT' and msg.fix_type < 3)):
+            return
+
+        time_unix_usec = (msg.time_unix_usec if msg.get_type()
+                          == 'SYSTEM_TIME' else msg.time_usec)
+
+        # Ignore times before 2000
+        if time_unix_usec < 946684800000000:
+            return
+
+        timestamps.append(msg._timestamp)
+        time_unix_usecs.append(time_unix_usec)
+
+    def _set_clock_offset(self, timestamps, time_unix_usecs):
+        """Sets clock_offset to the mean offset of the collected samples."""
+        if timestamps:
+            offsets = (np.frombuffer(timestamps, dtype=np.float64) -
+                       np.frombuffer(time_unix_usecs, dtype=np.uint64) /
+                       1_000_000)
+            self.clock_offset = float(offsets.mean())
+        else:
+            self.clock_offset = 0
         logger.debug(f"Calculated clock offset: {self.clock_offset}")
 
     def process_log(self):
@@ -106,56 +313,96 @@ class ArduPilotLogHandler:
             logger.error("Unsupported log type. Cannot process.")
 
     def process_tlog_on_the_fly(self):
-        """Processes TLOG files and extracts necessary details on the fly."""
-        self.get_clock_offset()
+        """Processes TLOG files and extracts necessary details on the fly.
+
+        The clock offset is averaged over the whole file, so the metadata
+        scan runs in the same pass as the offset samples and the start time
+        is corrected once the pass is done.
+        """
+        timestamps = array.array('d')
+        time_unix_usecs = array.array('Q')
+        start_time = None
+        prescan = True
         mavlog = mavutil.mavlink_connection(self.log_file_path)
+        start_pos = self._read_offset(mavlog)
         while True:
             try:
                 msg = mavlog.recv_match(type=['STATUSTEXT', 'PARAM_VALUE',
-                                              'SYSTEM_TIME'])
+                                              'SYSTEM_TIME', 'GPS_RAW_INT'])
                 if msg is None or msg.get_type() is None:
                     logger.debug("End of file reached.")
                     break
 
-                if msg.get_type() == 'STATUSTEXT' and not self.cube_id:
+                msg_type = msg.get_type()
+                if msg_type in ('SYSTEM_TIME', 'GPS_RAW_INT'):
+                    self._add_clock_sample(msg, timestamps, time_unix_usecs)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                break
+
+            if not prescan:
+                continue
+
+            # A bad metadata message only ends the pre-scan; the clock
+            # offset samples are still collected over the whole file
+            try:
+                if self._read_offset(mavlog) - start_pos > PRESCAN_MAX_BYTES:
+                    logger.debug("Pre-scan limit reached. Giving up.")
+                    prescan = False
+                    continue
+
+                if msg_type == 'STATUSTEXT' and not self.cube_id:
                     self.cube_id = self.extract_cube_id_from_msg(msg)
                     if self.cube_id:
                         logger.debug(f"Extracted cube_id: {self.cube_id}")
 
-                if msg.get_type() == "SYSTEM_TIME" and not self.start_time:
-                    self.start_time = ((msg.time_unix_usec -
-                                        msg.time_boot_ms * 1000) / 1_000_000)
-                    self.start_time -= self.clock_offset
-                    logger.debug(f"Extracted timestamp: {self.start_time}")
+                if msg_type == "SYSTEM_TIME" and not start_time:
+                    start_time = ((msg.time_unix_usec -
+                                   msg.time_boot_ms * 1000) / 1_000_000)
 
-                if (msg.get_type() == 'PARAM_VALUE' and
+                if (msg_type == 'PARAM_VALUE' and
                     msg.param_id == 'STAT_BOOTCNT' and
                         not self.boot_number):
                     self.boot_number = int(msg.param_value)
                     logger.debug(f"Extracted boot_number: {self.boot_number}")
 
-                if self.start_time and self.cube_id and self.boot_number:
-                    logger.debug("All required info extracted. Exiting early.")
-                    break
-
+                if start_time and self.cube_id and self.boot_number:
+                    logger.debug("All required info extracted.")
+                    prescan = False
             except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                break
+                logger.error(f"Error extracting metadata: {e}")
+                prescan = False
         mavlog.rewind()
 
+        self._set_clock_offset(timestamps, time_unix_usecs)
+        if start_time and not self.start_time:
+            self.start_time = start_time - self.clock_offset
+            logger.debug(f"Extracted timestamp: {self.start_time}")
+
     def process_bin_on_the_fly(self):
         """Processes BIN files and extracts necessary details on the fly."""
         mavlog = mavutil.mavlink_connection(self.log_file_path)
         self.boot_time = mavlog.clock.timebase  # in seconds
         logger.debug(f"Extracted boot time: {self.boot_time}")
+
+        start_pos = self._read_offset(mavlog)
+
+        # The start time comes from the very first message of any type
+        msg = mavlog.recv_match(blocking=True)
+        if msg and self.start_time is None:
+            self.start_time = self.extract_log_ts_ms(msg) / 1000
+            logger.debug(f"Extracted start time: {self.start_time}")
+
         while True:
-            msg = mavlog.recv_match(blocking=True)
+            # DFReader seeks straight to the requested types using its
+            # message index, so the rest of the log is never decoded
+            msg = mavlog.recv_match(type=['MSG', 'PARM'])
             if not msg:
                 break
 
-            if self.start_time is None:
-                self.start_time = self.extract_log_ts_ms(msg) / 1000
-                logger.debug(f"Extracted start time: {self.start_time}")
+            if self._read_offset(mavlog) - start_pos > PRESCAN_MAX_BYTES:
+                logger.debug("Pre-scan limit reached. Giving up.")
+                break
 
             if msg.get_type() == 'MSG' and not self.cube_id:
                 self.cube_id = self.extract_cube_id_from_msg(msg)
@@ -169,58 +416,100 @@ class ArduPilotLogHandler:
 
             if self.cube_id and self.boot_number and self.start_time:
                 logger.debug("All required info extracted. Exiting early.")
-                break
+                return
         mavlog.rewind()
 
+    def _read_offset(self, mavlog) -> int:
+        """Returns the reader's current byte position in the log file."""
+        if hasattr(mavlog, "offset"):  # DFReader
+            return mavlog.offset
+        return mavlog.f.tell()
+
     def extract_cube_id_from_msg(self, msg):
         """Extracts the Cube ID from the message using predefined patterns."""
-        search_patterns = [
-            r"CarbonixCubeOrange\s+(\S.*)",
-            r"CubeOrange\s+(\S.*)",
-            r"CubeOrange-Volanti\s+(\S.*)",
-            r"CubeOrange-Ottano\s+(\S.*)",
-            r"CubeOrange-Octano\s+(\S.*)",
-            r"CubeOrangePlus\s+(\S.*)",
-            r"CubeOrangePlus-Volanti\s+(\S.*)",
-            r"CubeOrangePlus-Ottano\s+(\S.*)",
-            r"CubeOrangePlus-Octano\s+(\S.*)"
-        ]
-        for pattern in search_patterns:
-            match = re.search(
-                pattern, msg.text if self.log_type == "TLOG" else msg.Message)
-            if match:
-                return match.group(1).strip()
+        text = msg.text if self.log_type == "TLOG" else msg.Message
+        # Almost no status text is a board banner; skip the regex for those
+        if "Cube" not in text:
+            return None
+        match = CUBE_ID_PATTERN.search(text)
+        if match:
+            return match.group(1).strip()
         return None
 
     def extract_log_ts_ms(self, msg) -> Optional[int]:
         """Extract timestamp in milliseconds from a log message."""
-        if hasattr(msg, "_timestamp") and msg._timestamp is not None:
-            return int(msg._timestamp * 1000)
+        timestamp = getattr(msg, "_timestamp", None)
+        if timestamp is not None:
+            return int(timestamp * 1000)
         return None
 
     def calculate_sha256(self):
         """Calculates the SHA256 hash for the given file."""
-        sha256_hash = hashlib.sha256()
-        with open(self.log_file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
-
-    def extract_parquet(self):
-        """Extracts time-series data and saves it in Parquet format."""
+        with open(self.log_file_path, "rb", buffering=0) as f:
+            try:
+                # Hash the whole mapping in one update() call, letting the
+                # kernel read ahead instead of copying through a Python buffer
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mmap, "MADV_SEQUENTIAL"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                        mm.madvise(mmap.MADV_WILLNEED)
+                    return hashlib.sha256(mm).hexdigest()
+            except (OSError, ValueError, OverflowError):
+                # Empty file, no room in a 32-bit address space, or a
+                # filesystem that cannot be mapped: hash by reading instead
+                pass
+
+            if hasattr(os, "posix_fadvise"):
+                # Readahead hints are per file descriptor; advisory only
+                try:
+                    os.posix_fadvise(f.fileno(), 0, 0,
+                                     os.POSIX_FADV_SEQUENTIAL)
+                except OSError:
+                    pass
+
+            if hasattr(hashlib, "file_digest"):
+                # Python 3.11+: read and hash loop runs entirely in C
+                return hashlib.file_digest(f, "sha256").hexdigest()
+
+            # Older Pythons: large blocks so each update() releases the GIL,
+            # reusing one buffer to avoid per-block allocations
+            sha256_hash = hashlib.sha256()
+            buf = bytearray(SHA256_BLOCK_SIZE)
+            view = memoryview(buf)
+            while True:
+                size = f.readinto(buf)
+                if not size:
+                    break
+                sha256_hash.update(view[:size])
+            return sha256_hash.hexdigest()
+
+    def extract_parquet(self, message_types=None):
+        """Extracts time-series data and saves it in Parquet format.
+
+        message_types optionally limits TLOG extraction to the given
+        MAVLink message types; by default every message is written. BIN
+        logs do not support it and raise ValueError if it is given.
+        """
         if self.log_type == "TLOG":
-            self.extract_tlog_to_parquet()
+            self.extract_tlog_to_parquet(message_types=message_types)
         else:
+            if message_types is not None:
+                raise ValueError(
+                    "message_types is only supported for TLOG logs, "
+                    f"not {self.log_type}")
             self.extract_msg_format()
             self.extract_bin_parquet_ts()
 
-    def extract_bin_parquet_ts(self, batch_size=10000):
-        """Final optimized version with path handling fix."""
+    def extract_bin_parquet_ts(self, batch_size=None):
+        """Final optimized version with path handling fix.
+
+        batch_size fixes the rows per row group; by default it is derived
+        from each message's row width (see BIN_BATCH_BYTES).
+        """
         logger.debug(f"Converting binary log to Parquet: {self.log_file_path}")
 
         # 1. Initialize MAVLink reader with minimal overhead
         mavlog = mavutil.mavlink_connection(self.log_file_path)
-        str_units = {"n", "N", "Z"}
 
         # 2. Schema definition
         schema = pa.schema([
@@ -236,8 +525,8 @@ class ArduPilotLogHandler:
         os.makedirs(output_path_prefix, exist_ok=True)
 
         # 4. Optimized data structures
-        writers = {}
-        dir_cache = set()  # Track created directories
+        groups = {}  # Rows per (msg_type, instance, after_instance_key)
+        parquet_writers = {}  # Open ParquetWriter per output file
         line_number = 0
         start_time = time.time()
 
@@ -248,7 +537,18 @@ class ArduPilotLogHandler:
                 continue
             instance_key = fmt.get("InstanceKey", 0)
             base_path = os.path.join(output_path_prefix, f"MessageType={msg_type}")
-            path_templates[msg_type] = (instance_key, base_path)
+            path_templates[msg_type] = (instance_key, base_path, fmt)
+
+        # Fields split around the instance key, per message type. Fields
+        # before the key are written under Instance=0, the rest under the
+        # message's instance. Plans are indexed by the FMT type id every
+        # message carries, so dispatch is a list index rather than a name
+        # lookup; each plan keeps its FMT object in case the id is reused.
+        field_plans = [None] * 256
+
+        # Writer threads for full batches, and their not yet checked futures
+        executor = ThreadPoolExecutor(max_workers=PARQUET_WRITE_WORKERS)
+        pending = deque()
 
         try:
             while True:
@@ -258,129 +558,205 @@ class ArduPilotLogHandler:
                     break
 
                 line_number += 1
-                msg_type = msg.get_type()
-
-                if msg_type not in path_templates:
-                    continue
 
                 # 7. Get pre-computed path info
-                instance_key, base_path = path_templates[msg_type]
-                instance = 0
-
-                # 8. Direct field access without getattr overhead
-                fieldnames = msg._fieldnames
-                values = [getattr(msg, f) for f in fieldnames]
-
-                for field, value in zip(fieldnames, values):
-                    if field in ["TimeUS", "MessageType", "mavpackettype"]:
-                        continue
-
-                    if field == instance_key:
-                        instance = value
-                        continue
-
-                    # 9. Fast value conversion
-                    format_type = self.log_format[msg_type].get(f"{field}_F", "")
-
-                    if not format_type or format_type in str_units:
-                        val, value_str, binary_value = None, str(value), None
-                    elif isinstance(value, array.array):
-                        val, value_str, binary_value = None, None, value.tobytes()
-                        if value.typecode == 'h' and value:
-                            val = float(value[0])
+                msg_fmt = msg.fmt
+                plan = field_plans[msg_fmt.type]
+                if plan is None or plan[0] is not msg_fmt:
+                    msg_type = msg_fmt.name
+                    template = path_templates.get(msg_type)
+                    if template is None:
+                        plan = (msg_fmt, None)
                     else:
-                        try:
-                            val, value_str, binary_value = float(value), None, None
-                        except (TypeError, ValueError):
-                            val, value_str, binary_value = None, str(value), None
-
-                    # 10. Path construction with dynamic directory creation
-                    dir_path = os.path.join(base_path, f"Instance={instance}", f"KeyName={field}")
-                    file_path = os.path.join(dir_path, "file.parquet")
-
-                    # 11. Create directory if needed (with cache)
-                    if dir_path not in dir_cache:
-                        os.makedirs(dir_path, exist_ok=True)
-                        dir_cache.add(dir_path)
-
-                    # 12. Batch collection
-                    if file_path not in writers:
-                        writers[file_path] = {
-                            'timestamps': array.array('q'),
-                            'linenums': array.array('q'),
-                            'values': array.array('f'),
-                            'str_values': [],
-                            'bin_values': [],
-                            'count': 0
-                        }
-
-                    data = writers[file_path]
-                    data['timestamps'].append(int(msg._timestamp * 1000) if hasattr(msg, "_timestamp") else 0)
-                    data['linenums'].append(line_number)
-                    if val is not None:
-                        data['values'].append(val)
-                    else:
-                        data['values'].append(float('nan'))
-                    data['str_values'].append(value_str)
-                    data['bin_values'].append(binary_value)
-                    data['count'] += 1
-
-                    # 13. Batch writing
-                    if data['count'] >= batch_size:
-                        self._write_parquet_batch_final(data, file_path, schema)
-                        data['timestamps'] = array.array('q')
-                        data['linenums'] = array.array('q')
-                        data['values'] = array.array('f')
-                        data['str_values'] = []
-                        data['bin_values'] = []
-                        data['count'] = 0
+                        instance_key, base_path, fmt = template
+                        fields = [field for field in msg._fieldnames
+                                  if field not in BIN_SKIP_FIELDS]
+                        if instance_key in fields:
+                            index = fields.index(instance_key)
+                            plan = (msg_fmt, msg_type, base_path, fmt,
+                                    tuple(fields[:index]), instance_key,
+                                    tuple(fields[index + 1:]))
+                        else:
+                            plan = (msg_fmt, msg_type, base_path, fmt,
+                                    tuple(fields), None, ())
+                    field_plans[msg_fmt.type] = plan
+                if plan[1] is None:
+                    continue
+                (_, msg_type, base_path, fmt,
+                 head_fields, instance_key, tail_fields) = plan
+
+                # 8. Rows are kept per message type and instance; values
+                # are converted column by column when the batch is written.
+                # DFMessage decodes fields in __getattr__, so call it
+                # directly rather than failing a normal lookup first.
+                getter = msg.__getattr__
+                timestamp = int(getattr(msg, "_timestamp", 0) * 1000)
+
+                parts = []
+                if head_fields:
+                    parts.append((0, False, head_fields))
+                if tail_fields:
+                    parts.append((getter(instance_key), True, tail_fields))
+
+                for instance, after_key, fields in parts:
+                    group = groups.get((msg_type, instance, after_key))
+                    if group is None:
+                        group = groups[(msg_type, instance, after_key)] = (
+                            self._new_bin_group(base_path, instance,
+                                                fields, fmt, batch_size))
+
+                    group['timestamps'].append(timestamp)
+                    group['linenums'].append(line_number)
+                    group['rows'].append(tuple(map(getter, fields)))
+
+                    # 9. Batch writing, off the reading thread
+                    if len(group['rows']) >= group['batch_rows']:
+                        self._submit_bin_group(executor, pending, group,
+                                               schema, parquet_writers)
 
         except Exception as e:
             logger.error(f"Error processing message: {e}")
         finally:
-            # Final writes
-            for file_path, data in writers.items():
-                if data['count'] > 0:
-                    self._write_parquet_batch_final(data, file_path, schema)
+            # Final writes, one task per group. Each output file belongs to
+            # exactly one group, so the tasks share no writers.
+            wait(pending)
+
+            def finish(group):
+                if group['rows']:
+                    self._write_bin_group(group, schema, parquet_writers)
+                for file_path, _ in group['fields']:
+                    writer = parquet_writers.get(file_path)
+                    if writer is not None:
+                        writer.close()
+
+            with executor:
+                list(executor.map(finish, groups.values()))
 
         elapsed = time.time() - start_time
         rate = line_number / elapsed if elapsed > 0 else 0
         logger.debug(f"Processed {line_number} messages in {elapsed:.2f}s ({rate:.1f} msg/s)")
 
-    def _write_parquet_batch_final(self, data, file_path, schema):
-        """Optimized batch writing with error handling."""
-        try:
-            # Convert to pyarrow arrays directly
-            timestamp_arr = pa.array(data['timestamps'], type=pa.int64())
-            linenum_arr = pa.array(data['linenums'], type=pa.int64())
-            value_arr = pa.array(data['values'], type=pa.float32())
-            str_arr = pa.array(data['str_values'], type=pa.string())
-            bin_arr = pa.array(data['bin_values'], type=pa.binary())
-
-            # Create table and write
-            table = pa.Table.from_arrays(
-                [timestamp_arr, linenum_arr, value_arr, str_arr, bin_arr],
-                schema=schema
-            )
-
-            # Write with optimal settings
-            pq.write_table(
-                table,
-                file_path,
-                compression='snappy',
-                use_dictionary=False,
-                write_statistics=False,
-                data_page_size=2*1024*1024  # 2MB pages
-            )
-        except Exception as e:
-            logger.error(f"Error writing to {file_path}: {e}")
-            raise
+    def _new_bin_group(self, base_path, instance, fields, fmt,
+                       batch_size=None):
+        """Creates the output folders and empty row batch for a BIN group."""
+        if batch_size is None:
+            row_width = BIN_ROW_BYTES + BIN_FIELD_BYTES * len(fields)
+            batch_size = max(MIN_BATCH_ROWS, BIN_BATCH_BYTES // row_width)
+        group_fields = []
+        for field in fields:
+            dir_path = os.path.join(base_path, f"Instance={instance}",
+                                    f"KeyName={field}")
+            os.makedirs(dir_path, exist_ok=True)
+            convert = _bin_column_converter(fmt.get(f"{field}_F"))
+            group_fields.append(
+                (os.path.join(dir_path, "file.parquet"), convert))
+        return {
+            'fields': group_fields,
+            'timestamps': array.array('q'),
+            'linenums': array.array('q'),
+            'rows': [],
+            'batch_rows': batch_size,
+            'future': None,  # Write of the previous batch, if any
+        }
+
+    def _submit_bin_group(self, executor, pending, group, schema,
+                          parquet_writers):
+        """Hands a group's full batch to a writer thread.
+
+        A group's previous batch is finished first so its files get row
+        groups in order, and at most MAX_PENDING_BATCHES are queued.
+        Failed writes are raised here, on the reading thread.
+        """
+        if group['future'] is not None:
+            group['future'].result()
+        while len(pending) >= MAX_PENDING_BATCHES:
+            pending.popleft().result()
+
+        batch = {
+            'fields': group['fields'],
+            'timestamps': group['timestamps'],
+            'linenums': group['linenums'],
+            'rows': group['rows'],
+        }
+        group['timestamps'] = array.array('q')
+        group['linenums'] = array.array('q')
+        group['rows'] = []
+        group['future'] = executor.submit(
+            self._write_bin_group, batch, schema, parquet_writers)
+        pending.append(group['future'])
+
+    def _write_bin_group(self, group, schema, parquet_writers):
+        """Appends a group's batch to each of its field files."""
+        # Timestamp and LineNumber are shared by every field of the group
+        timestamp_arr = _int64_array(group['timestamps'])
+        linenum_arr = _int64_array(group['linenums'])
+
+        for (file_path, convert), column in zip(group['fields'],
+                                                zip(*group['rows'])):
+            try:
+                value_arr, str_arr, bin_arr = convert(column)
+                table = pa.Table.from_arrays(
+                    [timestamp_arr, linenum_arr, value_arr, str_arr, bin_arr],
+                    schema=schema
+                )
+                writer = self._get_parquet_writer(
+                    parquet_writers, file_path, schema)
+                writer.write_table(table)
+            except Exception as e:
+                logger.error(f"Error writing to {file_path}: {e}")
+                raise
+
+    def _get_parquet_writer(self, parquet_writers, file_path, schema):
+        """Returns the open ParquetWriter for file_path, creating it once."""
+        writer = parquet_writers.get(file_path)
+        if writer is None:
+            writer = pq.ParquetWriter(file_path, schema,
+                                      **PARQUET_WRITE_OPTIONS)
+            parquet_writers[file_path] = writer
+        return writer
+
+    def _batch_to_table(self, data, schema):
+        """Builds an Arrow table straight from a dict of column lists."""
+        columns = []
+        for field in schema:
+            values = data[field.name]
+            if isinstance(values, array.array):
+                columns.append(_int64_array(values))
+            else:
+                # from_pandas=True keeps NaN values stored as nulls
+                columns.append(pa.array(values, type=field.type,
+                                        from_pandas=True))
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def _new_tlog_batch(self):
+        """Returns empty TLOG batch columns; integer columns are typed."""
+        return {
+            "Timestamp": array.array('q'),
+            "LineNumber": array.array('q'),
+            "Value": [],
+            "StringValue": [],
+            "BinaryValue": []
+        }
+
+    def _bin_field_plan(self, msg_type, fieldnames):
+        """Returns the fields to extract for a BIN message type, with an
+        (is_instance_key, converter) pair per field."""
+        fmt = self.log_format.get(msg_type)
+        if fmt is None or msg_type == "UNIT":
+            return ()
+        instance_key = fmt.get("InstanceKey", 0)
+        fields = tuple(
+            field for field in fieldnames
+            if field not in BIN_SKIP_FIELDS)
+        flags = [(field == instance_key,
+                  _bin_field_converter(fmt.get(f"{field}_F")))
+                 for field in fields]
+        return fields, flags
 
     def extract_bin_parquet_ts_old(self, batch_size=500000):
         """Extract time-series data BIN log and save it in Parquet format."""
         logger.debug(f"Extracting timeseries data from {self.log_file_path}")
         mavlog = mavutil.mavlink_connection(self.log_file_path)
-        str_units = {"n", "N", "Z"}
 
         schema = pa.schema([
             ("Timestamp", pa.int64()),
@@ -393,9 +769,14 @@ class ArduPilotLogHandler:
         start_time = time.time()
         data_batches = {}
         batches_count = {}
+        parquet_writers = {}
+        path_cache = {}  # (msg_type, instance, key) -> (output_path, batch)
         line_number = 0
         output_path_prefix = os.path.join(
             self.output_path, "LogUID=" + self.log_uid)
+        # msg_type -> (field names, [(is_instance_key, converter)]); empty
+        # for message types that are not extracted
+        field_plans = {}
         while True:
             try:
                 msg = mavlog.recv_match(blocking=True)
@@ -404,45 +785,38 @@ class ArduPilotLogHandler:
                 line_number += 1
 
                 msg_type = msg.get_type()
-                if msg_type in ["UNIT"] or msg_type not in self.log_format:
+                plan = field_plans.get(msg_type)
+                if plan is None:
+                    plan = field_plans[msg_type] = self._bin_field_plan(
+                        msg_type, msg._fieldnames)
+                if not plan:
                     continue
+                fieldnames, field_flags = plan
 
                 timestamp = self.extract_log_ts_ms(msg)
-                instance_key = self.log_format[msg_type].get("InstanceKey", 0)
                 instance = 0
-                msg_path = f"MessageType={msg_type}"
                 self.print_progress()
 
-                for key, value in msg.to_dict().items():
-                    if key in ["TimeUS", "MessageType", "mavpackettype"]:
-                        continue
-                    if key == instance_key:
+                for key, (is_instance_key, convert), value in zip(
+                        fieldnames, field_flags,
+                        map(msg.__getattr__, fieldnames)):
+                    if is_instance_key:
                         instance = value
                         continue
-                    format_type = self.log_format[msg_type].get(f"{key}_F")
-                    value_str, val, binary_value = None, None, None
                     try:
-                        if not format_type or format_type in str_units:
-                            value_str = str(value)
-                        elif isinstance(value, array.array):
-                            if value.typecode == 'h':
-                                float_values = [float(v) for v in value]
-                                val = float_values[0]
-                                binary_value = value.tobytes()
-                            else:
-                                binary_value = value.tobytes()
-                        else:
-                            val = float(value)
+                        val, value_str, binary_value = convert(value)
                     except Exception as e:
+                        val, value_str, binary_value = None, None, None
                         logger.error(
-                            f"Error converting value {value} to float for key "
-                            f"{key} in message type {msg_type}: {e}"
-                        )
-                    output_path = (f"{output_path_prefix}/{msg_path}"
-                                   f"/Instance={instance}"
-                                   f"/KeyName={key}/file.parquet")
-
-                    if output_path not in data_batches:
+                            "Error converting value %s to float for key "
+                            "%s in message type %s: %s",
+                            value, key, msg_type, e)
+                    cached = path_cache.get((msg_type, instance, key))
+                    if cached is None:
+                        output_path = (f"{output_path_prefix}"
+                                       f"/MessageType={msg_type}"
+                                       f"/Instance={instance}"
+                                       f"/KeyName={key}/file.parquet")
                         os.makedirs(os.path.dirname(
                             output_path), exist_ok=True)
                         data_batches[output_path] = {
@@ -453,38 +827,42 @@ class ArduPilotLogHandler:
                             "BinaryValue": []
                         }
                         batches_count[output_path] = 0
-
-                    data_batches[output_path]["Timestamp"].append(timestamp)
-                    data_batches[output_path]["LineNumber"].append(line_number)
-                    data_batches[output_path]["Value"].append(val)
-                    data_batches[output_path]["StringValue"].append(value_str)
-                    data_batches[output_path]["BinaryValue"].append(
-                        binary_value)
+                        cached = path_cache[(msg_type, instance, key)] = (
+                            output_path, data_batches[output_path])
+
+                    output_path, batch = cached
+                    batch["Timestamp"].append(timestamp)
+                    batch["LineNumber"].append(line_number)
+                    batch["Value"].append(val)
+                    batch["StringValue"].append(value_str)
+                    batch["BinaryValue"].append(binary_value)
                     batches_count[output_path] += 1
 
+                    # Once batch size limit is reached, append a row group
                     if batches_count[output_path] >= batch_size:
-                        df = pd.DataFrame(data_batches[output_path])
-                        table = pa.Table.from_pandas(df, schema=schema)
-                        if os.path.exists(output_path):
-                            existing_table = pq.read_table(output_path)
-                            combined_df = pd.concat(
-                                [existing_table.to_pandas(), df],
-                                ignore_index=True)
-                            table = pa.Table.from_pandas(
-                                combined_df, schema=schema)
-                        pq.write_table(table, output_path)
-                        data_batches[output_path] = {key: [] for key in
-                                                     data_batches[output_path]}
+                        table = self._batch_to_table(batch, schema)
+                        self._get_parquet_writer(
+                            parquet_writers, output_path, schema
+                        ).write_table(table)
+                        for column in batch.values():
+                            column.clear()
                         batches_count[output_path] = 0
 
             except Exception as e:
                 logger.error(f"Error processing message {msg}: {e}")
                 break
 
-        for output_path, data in data_batches.items():
-            df = pd.DataFrame(data)
-            table = pa.Table.from_pandas(df, schema=schema)
-            pq.write_table(table, output_path)
+        def finish(item):
+            output_path, data = item
+            if batches_count[output_path] > 0:
+                table = self._batch_to_table(data, schema)
+                self._get_parquet_writer(
+                    parquet_writers, output_path, schema
+                ).write_table(table)
+            parquet_writers[output_path].close()
+
+        with ThreadPoolExecutor(max_workers=PARQUET_WRITE_WORKERS) as executor:
+            list(executor.map(finish, data_batches.items()))
         print('')
         logger.debug("Telemetry data extraction completed.")
 
@@ -544,11 +922,21 @@ class ArduPilotLogHandler:
                     if msg.UnitIds[i] == "#" and "InstanceKey" not in details:
                         details["InstanceKey"] = col
 
-    def extract_tlog_to_parquet(self, batch_size=500000):
-        """Extracts telemetry data and saves it in Parquet format."""
+    def extract_tlog_to_parquet(self, batch_size=500000, message_types=None):
+        """Extracts telemetry data and saves it in Parquet format.
+
+        If message_types is given, only those MAVLink message types are
+        extracted; other messages are skipped before any field conversion.
+        LineNumber still counts every message in the log, so a row's
+        LineNumber is the same with or without a filter.
+        """
+        if message_types is not None:
+            message_types = set(message_types)
         mavlog = mavutil.mavlink_connection(self.log_file_path)
         logger.debug(f"Extracting telemetry data from {self.log_file_path}")
-        self.get_clock_offset()
+        # Already known if process_log() ran first
+        if self.clock_offset is None:
+            self.get_clock_offset()
 
         schema = pa.schema([
             ("Timestamp", pa.int64()),
@@ -560,99 +948,100 @@ class ArduPilotLogHandler:
 
         data_batches = {}
         batches_count = {}
+        parquet_writers = {}
+        # (msg_type, instance) -> (directory prefix, {key: (path, batch)})
+        path_cache = {}
         line_number = 0
         output_path_prefix = os.path.join(
             self.output_path, "LogUID=" + self.log_uid)
+        clock_offset_ms = self.clock_offset * 1000
 
         while True:
             try:
                 msg = mavlog.recv_match()
-                if msg is None or msg.get_type() is None:
+                msg_type = msg.get_type() if msg is not None else None
+                if msg_type is None:
                     print('')
                     logger.debug("No more messages to process.")
                     break
                 line_number += 1
+                if message_types is not None and msg_type not in message_types:
+                    continue
 
-                timestamp = (self.extract_log_ts_ms(msg) -
-                             (self.clock_offset*1000))
+                # One timestamp per message, shared by all of its fields
+                timestamp = int(self.extract_log_ts_ms(msg) - clock_offset_ms)
 
-                msg_path = f"MessageType={msg.get_type()}"
                 instance = msg.get_srcComponent()
                 self.print_progress()
+                type_paths = path_cache.get((msg_type, instance))
+                if type_paths is None:
+                    type_paths = path_cache[(msg_type, instance)] = (
+                        f"{output_path_prefix}/MessageType={msg_type}"
+                        f"/Instance={instance}", {})
+                path_prefix, key_paths = type_paths
                 for key, value in msg.to_dict().items():
-                    value_str, val, binary_value = None, None, None
-
+                    convert = TLOG_FIELD_CONVERTERS.get(
+                        type(value), _numeric_field)
                     try:
-                        if isinstance(value, str):
-                            value_str = value
-                        elif isinstance(value, (list, array.array, bytearray)):
-                            binary_value = bytes(value) if isinstance(
-                                value,
-                                (bytearray, array.array)) else str(value)
-                        else:
-                            val = float(value)
+                        val, value_str, binary_value = convert(value)
                     except Exception as e:
+                        val, value_str, binary_value = None, None, None
                         logger.error(
-                            f"Error converting value {value} to float for key "
-                            f"{key} in message type {msg}: {e}")
+                            "Error converting value %s to float for key "
+                            "%s in message type %s: %s", value, key, msg, e)
 
-                    output_path = (f"{output_path_prefix}/{msg_path}/Instance="
-                                   f"{instance}/KeyName={key}/file.parquet")
-                    if output_path not in data_batches:
+                    cached = key_paths.get(key)
+                    if cached is None:
+                        output_path = (f"{path_prefix}/KeyName={key}"
+                                       f"/file.parquet")
                         os.makedirs(os.path.dirname(
                             output_path), exist_ok=True)
-                        data_batches[output_path] = {
-                            "Timestamp": [],
-                            "LineNumber": [],
-                            "Value": [],
-                            "StringValue": [],
-                            "BinaryValue": []
-                        }
+                        data_batches[output_path] = self._new_tlog_batch()
                         batches_count[output_path] = 0
-
-                    data_batches[output_path]["Timestamp"].append(
-                        int(timestamp))
-                    data_batches[output_path]["LineNumber"].append(line_number)
-                    data_batches[output_path]["Value"].append(val)
-                    data_batches[output_path]["StringValue"].append(value_str)
-                    data_batches[output_path]["BinaryValue"].append(
-                        binary_value)
+                        cached = key_paths[key] = (
+                            output_path, data_batches[output_path])
+
+                    output_path, batch = cached
+                    batch["Timestamp"].append(timestamp)
+                    batch["LineNumber"].append(line_number)
+                    batch["Value"].append(val)
+                    batch["StringValue"].append(value_str)
+                    batch["BinaryValue"].append(binary_value)
                     batches_count[output_path] += 1
 
-                    # Once batch size limit is reached, save to Parquet file
+                    # Once batch size limit is reached, append a row group
                     if batches_count[output_path] >= batch_size:
-                        df = pd.DataFrame(data_batches[output_path])
-                        table = pa.Table.from_pandas(df, schema=schema)
-                        if os.path.exists(output_path):
-                            existing_table = pq.read_table(output_path)
-                            combined_df = pd.concat(
-                                [existing_table.to_pandas(),
-                                 df], ignore_index=True)
-                            table = pa.Table.from_pandas(
-                                combined_df, schema=schema)
-                        pq.write_table(table, output_path)
-                        data_batches[output_path] = {
-                            key: [] for key in data_batches[output_path]}
+                        table = self._batch_to_table(batch, schema)
+                        self._get_parquet_writer(
+                            parquet_writers, output_path, schema
+                        ).write_table(table)
+                        # Swap in fresh buffers: the flushed arrays may
+                        # still be exported to Arrow and cannot be resized
+                        batch.update(self._new_tlog_batch())
                         batches_count[output_path] = 0
 
             except Exception as e:
                 logger.error(f"Error processing message {msg}: {e}")
                 break
 
-        for output_path, data in data_batches.items():
-            df = pd.DataFrame(data)
-            table = pa.Table.from_pandas(df, schema=schema)
-            pq.write_table(table, output_path)
+        def finish(item):
+            output_path, data = item
+            if batches_count[output_path] > 0:
+                table = self._batch_to_table(data, schema)
+                self._get_parquet_writer(
+                    parquet_writers, output_path, schema
+                ).write_table(table)
+            parquet_writers[output_path].close()
+
+        with ThreadPoolExecutor(max_workers=PARQUET_WRITE_WORKERS) as executor:
+            list(executor.map(finish, data_batches.items()))
         logger.debug("Telemetry data extraction completed.")
         mavlog.rewind()
 
     def print_progress(self, threshold=100000):
         """Prints progress message after every threshold messages."""
-        # create a static variable to keep track of the count
-        if not hasattr(self, "_progress_count"):
-            self._progress_count = 0
         self._progress_count += 1
-        if self._progress_count % threshold == 0:
+        if self._progress_count >= threshold:
             print('.', end='', flush=True)
             self._progress_count = 0
 
@@ -664,15 +1053,16 @@ if __name__ == "__main__":
     parsed_args = parser.parse_args()
     file_path = parsed_args.file_path
     ap_handler = ArduPilotLogHandler(file_path)
-    log_uid = ap_handler.get_log_uid()
 
     ap_handler.process_log()
+    # Read after the pre-scan so the background hash overlaps with it
+    log_uid = ap_handler.get_log_uid()
     cube_id = ap_handler.cube_id
     start_time = ap_handler.start_time
     boot_number = ap_handler.boot_number
 
-    logger.debug(f"Log UID: {log_uid}, Cube ID: {cube_id}, "
-                 f"Timestamp: {start_time}, "
-                 f"Boot Number: {boot_number}")
+    logger.info(f"Log UID: {log_uid}, Cube ID: {cube_id}, "
+                f"Timestamp: {start_time}, "
+                f"Boot Number: {boot_number}")
 
     ap_handler.extract_parquet()
@@ -13,8 +13,8 @@ setup(
     packages=find_packages(),
     install_requires=[
         "pymavlink>=2.4.0",
-        "pandas>=1.3.0",
-        "pyarrow>=5.0.0"
+        "numpy",
+        "pyarrow>=8.0.0"
     ],
     python_requires=">=3.7",
     classifiers=[
@@ -0,0 +1,49 @@
+# tests/conftest.py
+import struct
+import pytest
+from pymavlink.dialects.v20 import ardupilotmega as mavlink
+from ardupilot_log_handler.ap_log_handler import ArduPilotLogHandler
+
+
+@pytest.fixture(scope="session")
+def loaded_handler(tmp_path_factory):
+    """
+    Handler for example1.BIN with the log processed and formats extracted.
+    Parsed once per test run and shared; tests must not modify it. Output
+    goes to a temporary folder, never the repo's output/.
+    """
+    out = tmp_path_factory.mktemp("handler_output")
+    h = ArduPilotLogHandler("tests/test_data/example1.BIN", output_path=str(out))
+    h.process_log()
+    h.extract_msg_format()
+    return h
+
+
+@pytest.fixture(scope="session")
+def generated_output(tmp_path_factory):
+    """
+    Directory holding the Parquet output of example1.BIN, extracted once
+    per test run into a temporary folder.
+    """
+    out = tmp_path_factory.mktemp("output")
+    h = ArduPilotLogHandler("tests/test_data/example1.BIN", output_path=str(out))
+    h.process_log()
+    h.extract_parquet()
+    return str(out)
+
+
+@pytest.fixture
+def make_tlog(tmp_path):
+    """
+    Returns a function writing MAVLink messages to a .tlog in tmp_path,
+    each prefixed with its big-endian microsecond receive time.
+    """
+    def write(messages, name="test.tlog"):
+        mav = mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+        path = tmp_path / name
+        with open(path, "wb") as f:
+            for i, msg in enumerate(messages):
+                f.write(struct.pack(">Q", 1_700_000_000_000_000 + i * 1000))
+                f.write(msg.pack(mav))
+        return str(path)
+    return write
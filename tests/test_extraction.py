@@ -1,19 +1,21 @@
 # tests/test_extraction.py
+import glob
 import json
 import os
+import pytest
+import pyarrow.parquet as pq
+from pymavlink.dialects.v20 import ardupilotmega as mavlink
+from types import SimpleNamespace
 from ardupilot_log_handler.ap_log_handler import ArduPilotLogHandler
 
 
-def test_metadata_extraction():
-    log_path = "tests/test_data/example1.BIN"
+def test_metadata_extraction(loaded_handler):
     expected_path = "tests/test_data/expected_values.json"
 
     with open(expected_path, "r") as f:
         expected = json.load(f)
 
-    handler = ArduPilotLogHandler(log_path)
-    handler.process_log()
-    handler.extract_msg_format()
+    handler = loaded_handler
 
     assert handler.get_log_uid() == expected["log_uid"]
     assert handler.log_type == expected["log_type"]
@@ -22,3 +24,106 @@ def test_metadata_extraction():
     assert handler.boot_number == expected["boot_number"]
     assert handler.cube_id == expected["cube_id"]
     assert len(handler.log_format) == expected["log_format_size"]
+
+
+def test_cube_id_patterns():
+    # Only the regex is exercised; skip __init__ so no log is read or hashed
+    handler = ArduPilotLogHandler.__new__(ArduPilotLogHandler)
+    handler.log_type = "BIN"
+    boards = [
+        "CarbonixCubeOrange", "CubeOrange", "CubeOrange-Volanti",
+        "CubeOrange-Ottano", "CubeOrange-Octano", "CubeOrangePlus",
+        "CubeOrangePlus-Volanti", "CubeOrangePlus-Ottano",
+        "CubeOrangePlus-Octano",
+    ]
+    for board in boards:
+        msg = SimpleNamespace(Message=f"{board} 0033003C 34305106 35383431 ")
+        assert handler.extract_cube_id_from_msg(msg) == \
+            "0033003C 34305106 35383431", board
+
+    msg = SimpleNamespace(Message="ChibiOS: 93e6e03d")
+    assert handler.extract_cube_id_from_msg(msg) is None
+
+    # TLOG STATUSTEXT carries the banner in .text
+    handler.log_type = "TLOG"
+    msg = SimpleNamespace(text="CubeOrangePlus 0033003C 34305106 35383431")
+    assert handler.extract_cube_id_from_msg(msg) == \
+        "0033003C 34305106 35383431"
+    msg = SimpleNamespace(text="ArduPlane V4.2.1")
+    assert handler.extract_cube_id_from_msg(msg) is None
+
+
+def test_missing_log_raises():
+    with pytest.raises(FileNotFoundError):
+        ArduPilotLogHandler("tests/test_data/missing.BIN")
+
+
+def test_message_types_rejected_for_bin():
+    handler = ArduPilotLogHandler.__new__(ArduPilotLogHandler)
+    handler.log_type = "BIN"
+    with pytest.raises(ValueError):
+        handler.extract_parquet(message_types=["ATT"])
+
+
+def test_tlog_message_types_filter(make_tlog, tmp_path):
+    messages = [mavlink.MAVLink_heartbeat_message(1, 3, 0, 0, 4, 3)]
+    for i in range(3):
+        messages.append(mavlink.MAVLink_attitude_message(
+            i * 100, 0.1 * i, 0.2, 0.3, 0, 0, 0))
+        messages.append(mavlink.MAVLink_heartbeat_message(1, 3, 0, 0, 4, 3))
+    log_path = make_tlog(messages)
+
+    line_numbers = {}
+    for name, message_types in (("all", None), ("filtered", ["ATTITUDE"])):
+        output = tmp_path / name
+        handler = ArduPilotLogHandler(log_path, output_path=str(output))
+        handler.process_log()
+        handler.extract_parquet(message_types=message_types)
+        types = {os.path.basename(path) for path in
+                 glob.glob(f"{output}/LogUID=*/MessageType=*")}
+        roll = glob.glob(f"{output}/LogUID=*/MessageType=ATTITUDE/"
+                         "Instance=1/KeyName=roll/file.parquet")
+        line_numbers[name] = (
+            pq.read_table(roll[0]).column("LineNumber").to_pylist())
+        if message_types:
+            assert types == {"MessageType=ATTITUDE"}
+        else:
+            assert types == {"MessageType=ATTITUDE", "MessageType=HEARTBEAT"}
+
+    # LineNumber is the position in the whole log, filter or not
+    assert line_numbers["all"] == line_numbers["filtered"] == [2, 4, 6]
+
+
+def test_tlog_clock_offset_survives_metadata_error(make_tlog):
+    # Receive times are 1.7e9 s + 1 ms per message (see make_tlog)
+    def system_time(index, offset_s):
+        unix_usec = 1_700_000_000_000_000 + index * 1000 - offset_s * 1_000_000
+        return mavlink.MAVLink_system_time_message(unix_usec, 1000)
+
+    messages = [
+        system_time(0, 10),
+        # int(NaN) fails while reading the boot count
+        mavlink.MAVLink_param_value_message(
+            b"STAT_BOOTCNT", float("nan"), 9, 1, 0),
+        system_time(2, 20),
+    ]
+    handler = ArduPilotLogHandler(make_tlog(messages))
+    handler.process_log()
+
+    assert handler.boot_number == 0
+    assert abs(handler.clock_offset - 15) < 1e-3
+
+
+def test_tlog_clock_sample_above_int64(make_tlog):
+    # time_unix_usec is a uint64; values from 2**63 up must not overflow
+    messages = [
+        mavlink.MAVLink_system_time_message(2**63 + 1, 1000),
+        mavlink.MAVLink_param_value_message(b"STAT_BOOTCNT", 7, 9, 1, 0),
+    ]
+    handler = ArduPilotLogHandler(make_tlog(messages))
+    handler.process_log()
+    assert handler.boot_number == 7
+
+    handler.get_clock_offset()
+    assert handler.clock_offset == pytest.approx(
+        1_700_000_000 - (2**63 + 1) / 1_000_000)
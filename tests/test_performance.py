@@ -1,48 +1,64 @@
 # tests/test_performance.py
 import os
+import sys
 import time
-import tracemalloc
-import threading
-import matplotlib.pyplot as plt
-from ardupilot_log_handler.ap_log_handler import ArduPilotLogHandler
+import signal
+import numpy as np
+import pytest
+
+# ru_maxrss and setitimer are POSIX-only; skip the module elsewhere
+resource = pytest.importorskip("resource")
+
+
+# ru_maxrss is in KiB on Linux, bytes on macOS
+RSS_TO_MB = (1 if sys.platform == "darwin" else 1024) / (1024 * 1024)
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
 
 
 def profile_function(func, *args, interval_sec=5, **kwargs):
     memory_log = []
     timestamps = []
-    keep_running = True
 
-    def memory_sampler():
-        while keep_running:
-            current, peak = tracemalloc.get_traced_memory()
-            memory_log.append(current / 1024 / 1024)  # MB
-            timestamps.append(time.time() - start_time)
-            time.sleep(interval_sec)
+    # ru_maxrss is already a high-water mark, so no sampler thread is
+    # needed; a SIGALRM timer records it on the main thread for the plot
+    def sample(signum=None, frame=None):
+        memory_log.append(max_rss())
+        timestamps.append(time.time() - start_time)
 
-    tracemalloc.start()
     start_time = time.time()
 
-    thread = threading.Thread(target=memory_sampler)
-    thread.start()
-
-    func(*args, **kwargs)
+    previous_handler = signal.signal(signal.SIGALRM, sample)
+    sample()
+    signal.setitimer(signal.ITIMER_REAL, interval_sec, interval_sec)
+    try:
+        func(*args, **kwargs)
+        exec_time = time.time() - start_time
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
 
-    keep_running = False
-    thread.join()
+    peak = max_rss() * RSS_TO_MB
+    memory_mb = np.asarray(memory_log, dtype=np.float64) * RSS_TO_MB
 
-    exec_time = time.time() - start_time
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
+    plot_memory_usage(timestamps, memory_mb, exec_time)
 
-    plot_memory_usage(timestamps, memory_log, exec_time)
-
-    return round(exec_time, 2), round(peak / 1024 / 1024, 2)
+    return round(exec_time, 2), round(peak, 2)
 
 
 def plot_memory_usage(timestamps, memory_log, total_time):
+    if len(timestamps) < 2:
+        print("Run too short to plot memory usage")
+        return
+
     output_dir = "reports"
     os.makedirs(output_dir, exist_ok=True)  # ✅ Ensure the folder exists
 
+    # Imported here so short runs never load matplotlib
+    import matplotlib
+    matplotlib.use("Agg")  # Headless; skip GUI backend discovery
     import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 5))
     plt.plot(timestamps, memory_log, marker='o')
@@ -54,13 +70,12 @@ def plot_memory_usage(timestamps, memory_log, total_time):
 
     output_path = os.path.join(output_dir, "memory_usage_plot.png")
     plt.savefig(output_path)
+    plt.close()
     print(f"📊 Memory usage plot saved to {output_path}")
 
 
-def test_extract_bin_parquet_ts_performance():
-    handler = ArduPilotLogHandler("tests/test_data/example1.BIN")
-    handler.process_log()
-    handler.extract_msg_format()
+def test_extract_bin_parquet_ts_performance(loaded_handler):
+    handler = loaded_handler
 
     exec_time, peak_memory = profile_function(handler.extract_bin_parquet_ts, interval_sec=5)
 
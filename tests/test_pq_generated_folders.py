@@ -1,5 +1,6 @@
 # tests/test_pq_generated_folders.py
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 
 def collect_relative_file_paths(base_dir):
@@ -7,24 +8,42 @@ def collect_relative_file_paths(base_dir):
     Walks the directory and returns a set of all relative file paths.
     """
     relative_paths = set()
-    for root, dirs, files in os.walk(base_dir):
-        for file in files:
-            full_path = os.path.join(root, file)
-            relative_path = os.path.relpath(full_path, base_dir)
-            relative_paths.add(relative_path.replace("\\", "/"))  # normalize
+    _scan(base_dir, "", relative_paths)
     return relative_paths
 
 
-def test_folder_structure_and_file_match():
-    expected_dir = "tests/test_data/expected_output"
-    generated_dir = "output"
+def _scan(directory, prefix, relative_paths):
+    """
+    Adds files under directory to relative_paths as prefix + "/"-joined
+    names. DirEntry caches the file type, so no extra stat is needed.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _scan(entry.path, prefix + entry.name + "/", relative_paths)
+            else:
+                relative_paths.add(prefix + entry.name)
 
-    expected_paths = collect_relative_file_paths(expected_dir)
-    generated_paths = collect_relative_file_paths(generated_dir)
 
-    # ✅ Compare missing and extra files
-    missing_in_generated = expected_paths - generated_paths
-    extra_in_generated = generated_paths - expected_paths
+def test_folder_structure_and_file_match(generated_output):
+    expected_dir = "tests/test_data/expected_output"
+    generated_dir = generated_output
+
+    # The trees are disjoint and scandir releases the GIL, so scan both at once
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        expected_future = executor.submit(collect_relative_file_paths,
+                                          expected_dir)
+        generated_future = executor.submit(collect_relative_file_paths,
+                                           generated_dir)
+        expected_paths = expected_future.result()
+        generated_paths = generated_future.result()
+
+    # ✅ Compare missing and extra files; one pass when the trees match
+    missing_in_generated = extra_in_generated = set()
+    differing = expected_paths ^ generated_paths
+    if differing:
+        missing_in_generated = differing & expected_paths
+        extra_in_generated = differing - expected_paths
 
     if missing_in_generated:
         print("❌ Missing files in output:")
@@ -1,33 +1,37 @@
 # tests/test_pq_schema.py
 import os
+import glob
+import pytest
 import pyarrow.parquet as pq
-import pandas as pd
 
+EXPECTED_DIR = "tests/test_data/expected_output"
+EXPECTED_FILES = sorted(
+    os.path.relpath(path, EXPECTED_DIR).replace(os.sep, "/")
+    for path in glob.glob(os.path.join(EXPECTED_DIR, "**", "file.parquet"),
+                          recursive=True)
+)
 
-def test_compare_generated_to_expected_parquet():
-    # Expected and generated file paths
-    expected_file = (
-        "tests/test_data/expected_output/"
-        "LogUID=230dd76680f14b07ad942b9a5c312ed134863823e73836c7a40b61e464630415/"
-        "MessageType=ATT/Instance=0/KeyName=Roll/file.parquet"
-    )
 
-    generated_file = (
-        "output/LogUID=230dd76680f14b07ad942b9a5c312ed134863823e73836c7a40b61e464630415/"
-        "MessageType=ATT/Instance=0/KeyName=Roll/file.parquet"
-    )
+@pytest.mark.parametrize("relative_path", EXPECTED_FILES)
+def test_compare_generated_to_expected_parquet(generated_output,
+                                               relative_path):
+    # Expected and generated file paths
+    expected_file = os.path.join(EXPECTED_DIR, relative_path)
+    generated_file = os.path.join(generated_output, relative_path)
 
     # Step 1: Validate files exist
     assert os.path.exists(expected_file), f"Missing expected file: {expected_file}"
     assert os.path.exists(generated_file), f"Missing generated file: {generated_file}"
 
-    # Step 2: Load both files
-    expected_table = pq.read_table(expected_file)
-    generated_table = pq.read_table(generated_file)
+    # Step 2: Read only the footers for the cheap checks
+    expected_pf = pq.ParquetFile(expected_file, memory_map=True)
+    generated_pf = pq.ParquetFile(generated_file, memory_map=True)
+    expected_meta = expected_pf.metadata
+    generated_meta = generated_pf.metadata
 
     # Step 3: Compare schema
-    expected_schema = set(expected_table.schema.names)
-    generated_schema = set(generated_table.schema.names)
+    expected_schema = set(expected_meta.schema.to_arrow_schema().names)
+    generated_schema = set(generated_meta.schema.to_arrow_schema().names)
 
     assert expected_schema.issubset(generated_schema), (
         f"Generated file is missing columns."
@@ -35,26 +39,38 @@ def test_compare_generated_to_expected_parquet():
     )
 
     # Step 4: Compare row counts
-    expected_rows = expected_table.num_rows
-    generated_rows = generated_table.num_rows
+    expected_rows = expected_meta.num_rows
+    generated_rows = generated_meta.num_rows
 
     print(f"Expected rows: {expected_rows}, Generated rows: {generated_rows}")
     assert expected_rows == generated_rows, (
         f"Row count mismatch. Expected: {expected_rows}, Got: {generated_rows}"
     )
 
-    # Step 5: Compare values (optional, strict)
-    expected_df = expected_table.to_pandas()
-    generated_df = generated_table.to_pandas()
-
-    # Only compare required columns
-    columns_to_check = ["Timestamp", "LineNumber", "Value", "StringValue", "BinaryValue"]
-    for col in columns_to_check:
-        if col in expected_df and col in generated_df:
-            pd.testing.assert_series_equal(
-                expected_df[col], generated_df[col],
-                check_names=False,
-                obj=f"Mismatch in column '{col}'"
+    # Step 5: Stream only the columns that are compared
+    columns_to_check = [
+        col for col in ["Timestamp", "LineNumber", "Value", "StringValue",
+                        "BinaryValue"]
+        if col in expected_schema and col in generated_schema
+    ]
+    # FMT timestamps depend on how the pymavlink version clocks the header
+    if "/MessageType=FMT/" in relative_path:
+        columns_to_check.remove("Timestamp")
+    # Batches are cut at batch_size rows regardless of row groups, so with
+    # equal row counts the two streams line up batch for batch
+    expected_batches = expected_pf.iter_batches(batch_size=65536,
+                                                columns=columns_to_check)
+    generated_batches = generated_pf.iter_batches(batch_size=65536,
+                                                  columns=columns_to_check)
+
+    # Step 6: Compare values (optional, strict)
+    for expected_batch, generated_batch in zip(expected_batches,
+                                               generated_batches):
+        for col in columns_to_check:
+            expected_col = expected_batch.column(col)
+            generated_col = generated_batch.column(col)
+            assert expected_col.equals(generated_col), (
+                f"Mismatch in column '{col}' of {relative_path}"
             )
 
     print("✅ Parquet file matches expected output.")
@@ -7,8 +7,7 @@ report_dir = "reports"
 report_files = [
     "extraction.json",
     "performance.json",
-    "schema.json",
-    "folder.json"
+    "output.json"
 ]
 
 summary_md = os.path.join(report_dir, "test_report.md")
@@ -22,12 +21,13 @@ for file in report_files:
         continue
     with open(path) as f:
         data = json.load(f)
+        summary = data.get("summary") or {}
         entry = {
-            "name": data.get("summary", {}).get("name", os.path.splitext(file)[0]),
-            "outcome": data.get("summary", {}).get("outcome", "unknown"),
+            "name": summary.get("name", os.path.splitext(file)[0]),
+            "outcome": summary.get("outcome", "unknown"),
             "duration": data.get("duration", 0),
-            "tests": data.get("summary", {}).get("tests", 0),
-            "failures": data.get("summary", {}).get("failed", 0),
+            "tests": summary.get("tests", 0),
+            "failures": summary.get("failed", 0),
         }
         results.append(entry)
 
@@ -36,20 +36,24 @@ with open(summary_json, "w") as f:
     json.dump(results, f, indent=2)
 
 # Save Markdown summary
+lines = [
+    f"# ✅ Test Report — {datetime.utcnow().isoformat()} UTC\n\n",
+    "| Test | Outcome | Duration (s) | Total | Failures |\n",
+    "|------|---------|---------------|--------|-----------|\n",
+]
+for r in results:
+    emoji = "✅" if r["outcome"] == "passed" else "❌"
+    lines.append(f"| {r['name']} | {emoji} {r['outcome']} | {r['duration']:.2f} | {r['tests']} | {r['failures']} |\n")
+
+# Append memory usage plot link to markdown
+plot_path = "memory_usage_plot.png"
+if os.path.exists(os.path.join(report_dir, plot_path)):
+    lines.append(f"\n## 📊 Memory Usage Over Time\n")
+    lines.append(f"![Memory Usage](./{plot_path})\n")
+
+lines.append("\n---\n")
+lines.append("✅ Tests are run using `pytest`, performance tracked via `pytest-benchmark`, and coverage via `pytest-cov`.\n")
+lines.append("📊 Memory profiling every 5s using `resource.getrusage`.\n")
+
 with open(summary_md, "w") as f:
-    f.write(f"# ✅ Test Report — {datetime.utcnow().isoformat()} UTC\n\n")
-    f.write("| Test | Outcome | Duration (s) | Total | Failures |\n")
-    f.write("|------|---------|---------------|--------|-----------|\n")
-    for r in results:
-        emoji = "✅" if r["outcome"] == "passed" else "❌"
-        f.write(f"| {r['name']} | {emoji} {r['outcome']} | {r['duration']:.2f} | {r['tests']} | {r['failures']} |\n")
-
-    # Append memory usage plot link to markdown
-    plot_path = "memory_usage_plot.png"
-    if os.path.exists(os.path.join(report_dir, plot_path)):
-        f.write(f"\n## 📊 Memory Usage Over Time\n")
-        f.write(f"![Memory Usage](./{plot_path})\n")
-
-    f.write("\n---\n")
-    f.write("✅ Tests are run using `pytest`, performance tracked via `pytest-benchmark`, and coverage via `pytest-cov`.\n")
-    f.write("📊 Memory profiling every 5s using `tracemalloc`.\n")
+    f.writelines(lines)
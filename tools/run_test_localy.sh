@@ -6,9 +6,5 @@ rm -rf output/
 pytest tests/test_extraction.py -s
 pytest tests/test_performance.py -s
 
-# Generate output
-python tools/generate_output.py
-
-# Run tests that depend on output
-pytest tests/test_pq_schema.py -s
-pytest tests/test_pq_generated_folders.py -s
+# Run tests that depend on output (generated once per session)
+pytest tests/test_pq_schema.py tests/test_pq_generated_folders.py -s